@@ -0,0 +1,34 @@
+'''
+Example driver showing the simplified end-to-end workflow (see example_simple.py), run through MeshPipeline,
+so mesh reads/writes happen in the background and overlap with the meshing stages
+
+NOTE
+- Mesh build is performed wherever the .msh file is by default (so for this script, in resource/)
+- There are a lot of intermediate files that get written in this workflow, that arent cleaned up.
+'''
+import os
+from src.gen_blmesh import gen_blmesh
+from src.gen_farfield import gen_farfield
+from src.pipeline import MeshPipeline
+
+if __name__ == '__main__':
+
+    with MeshPipeline() as pipe:
+
+        # input .msh surface mesh, converted to ugrid for mesh_tools
+        SurfMesh = pipe.read('resource/rocket_stubby_surf.msh')
+        surf_ugrid = pipe.write(SurfMesh, 'resource/rocket_stubby_surf.ugrid')
+
+        # mesh_tools: extrude BoundaryLayer mesh from surface mesh
+        BoundLayerMesh = pipe.run('gen_blmesh', gen_blmesh, surf_ugrid, num_bl_layers=10, near_wall_spacing=4.2e-5, bl_growth_rate=1.5)
+
+        # BL mesh outputs are written in the background, while gmsh builds the farfield around the in-memory BL mesh
+        pipe.write(BoundLayerMesh, 'resource/rocket_stubby_BLMESH.msh')
+        pipe.write(BoundLayerMesh, 'resource/rocket_stubby_BLMESH.vtu')
+        VolumeMesh = pipe.run('gen_farfield', gen_farfield, BoundLayerMesh, farfield_radius=15, farfield_Lc=25, extend_power=.2, 
+                              volmesh_msh_path=os.path.abspath('resource/rocket_stubby_VOLMESH.msh'))
+
+        # finally, volume mesh to .ugrid
+        pipe.write(VolumeMesh, 'resource/rocket_stubby_VOLMESH_FINAL.ugrid')
+
+    print(pipe.timeline())
@@ -0,0 +1,121 @@
+import os
+import gmsh
+
+from .gmsh_helpers import sphere_surf, physical_surface_to_umesh
+from .ugrid_tools import UMesh
+
+
+# Library of precomputed outer-boundary (farfield extent) surface meshes, cached on disk as .umz
+# so that only the body-dependent part of the farfield has to be built per-case. 
+# Templates are injected into gen_farfield as discrete surfaces, see gen_farfield(farfield_template=...)
+
+TEMPLATE_SHAPES = ('sphere', 'box', 'cylinder')
+FARFIELD_TAG = 3    # FUN3D farfield tag, matching sphere_surf physical group in gen_farfield
+TEMPLATE_VERSION = 2    # bump when template generation changes, so stale cached templates aren't reused
+DEFAULT_CACHE_DIR = os.environ.get('CFD_MESHMAN_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'cfd-meshman', 'farfield_templates'))
+
+
+def farfield_template(shape, size, lc, cache_dir=DEFAULT_CACHE_DIR, numthreads=4):
+    '''
+    Returns the outer-boundary surface mesh for a given shape and sizing, generating and caching it on first use.
+
+    INPUTS:
+        shape: str, one of TEMPLATE_SHAPES. All are centered at the origin, cylinder axis is along x
+        size: float, sphere radius / box half-width / cylinder radius and half-length
+        lc: float, (uniform) target element size on the boundary
+
+    OUTPUTS:
+        Template: UMesh, triangulated closed surface, all faces tagged FARFIELD_TAG
+
+    NOTES:
+        - Unlike sphere_surf within gen_farfield, the template is meshed with uniform sizing (lc), not under the farfield size fields
+        - No symmetry half-domains yet, since gen_farfield does not support symmetry planes 
+    '''
+
+    if shape not in TEMPLATE_SHAPES:
+        raise Exception(f'Unrecognized farfield template shape {shape}, must be one of {TEMPLATE_SHAPES}')
+
+    template_path = os.path.join(cache_dir, f'{shape}_size{float(size):.8g}_lc{float(lc):.8g}_v{TEMPLATE_VERSION}.umz')
+
+    if os.path.exists(template_path):
+        print(f'Using cached farfield template: {template_path}')
+        return UMesh(template_path)
+
+    print(f'Generating farfield template: {template_path}')
+
+    gmsh.initialize()
+    gmsh.option.setNumber("General.NumThreads", numthreads)
+    gmsh.model.add("farfield_template")
+
+    match shape:
+        case 'sphere':
+            sphere_surf(x=0, y=0, z=0, r=size, lc=lc, surf_tag=50, physical_group=FARFIELD_TAG)
+        case 'box':
+            extruded_surf(square_curve_loop(size, lc), size, FARFIELD_TAG)
+        case 'cylinder':
+            extruded_surf(circle_curve_loop(size, lc), size, FARFIELD_TAG)
+
+    gmsh.model.mesh.generate(2)
+    Template = physical_surface_to_umesh(FARFIELD_TAG, FARFIELD_TAG)
+    gmsh.finalize()
+
+    # write to temp and move, so concurrent runs never see a partial template
+    os.makedirs(cache_dir, exist_ok=True)
+    Template.write(template_path+f'.{os.getpid()}.umz')
+    os.replace(template_path+f'.{os.getpid()}.umz', template_path)
+
+    return Template
+
+
+
+def square_curve_loop(half_width, lc):
+    # square in the x=-half_width plane
+
+    x = -half_width
+    p1 = gmsh.model.geo.addPoint(x, -half_width, -half_width, lc)
+    p2 = gmsh.model.geo.addPoint(x,  half_width, -half_width, lc)
+    p3 = gmsh.model.geo.addPoint(x,  half_width,  half_width, lc)
+    p4 = gmsh.model.geo.addPoint(x, -half_width,  half_width, lc)
+
+    l1 = gmsh.model.geo.addLine(p1, p2)
+    l2 = gmsh.model.geo.addLine(p2, p3)
+    l3 = gmsh.model.geo.addLine(p3, p4)
+    l4 = gmsh.model.geo.addLine(p4, p1)
+
+    return gmsh.model.geo.addCurveLoop([l1, l2, l3, l4])
+
+
+
+def circle_curve_loop(r, lc):
+    # circle of radius r in the x=-r plane
+
+    x = -r
+    p0 = gmsh.model.geo.addPoint(x, 0, 0, lc)
+    p1 = gmsh.model.geo.addPoint(x, r, 0, lc)
+    p2 = gmsh.model.geo.addPoint(x, 0, r, lc)
+    p3 = gmsh.model.geo.addPoint(x, -r, 0, lc)
+    p4 = gmsh.model.geo.addPoint(x, 0, -r, lc)
+
+    c1 = gmsh.model.geo.addCircleArc(p1, p0, p2)
+    c2 = gmsh.model.geo.addCircleArc(p2, p0, p3)
+    c3 = gmsh.model.geo.addCircleArc(p3, p0, p4)
+    c4 = gmsh.model.geo.addCircleArc(p4, p0, p1)
+
+    return gmsh.model.geo.addCurveLoop([c1, c2, c3, c4])
+
+
+
+def extruded_surf(curve_loop, half_length, physical_group):
+    # closed surface from extruding a planar curve loop by 2*half_length along x (box, cylinder)
+
+    s_base = gmsh.model.geo.addPlaneSurface([curve_loop])
+    extruded = gmsh.model.geo.extrude([(2, s_base)], 2*half_length, 0, 0)
+
+    # extrude returns the top surface, the volume, then the lateral surfaces
+    surfs = [s_base] + [tag for dim, tag in extruded if dim == 2]
+
+    gmsh.model.geo.synchronize()
+    gmsh.model.addPhysicalGroup(2, surfs, physical_group)
+
+    # base surface normal points along +x (inwards), flip its mesh so all faces are oriented the same way (outwards)
+    gmsh.model.mesh.setReverse(2, s_base)
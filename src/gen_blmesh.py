@@ -8,7 +8,7 @@ from .ugrid_tools import UMesh
 from .extrude_config import EXTRUDE_CONFIG
 
 
-def gen_blmesh(surfmesh_ugrid_path, num_bl_layers=10, near_wall_spacing=1e-4, bl_growth_rate=1.3, write_vtk=False):
+def gen_blmesh(surfmesh_ugrid_path, num_bl_layers=10, near_wall_spacing=1e-4, bl_growth_rate=1.3, write_vtk=False, check_surface=True):
     ''' 
     TODO: 
         - MAKE THIS USE A TEMP DIR? Add cleanup command?
@@ -22,6 +22,7 @@ def gen_blmesh(surfmesh_ugrid_path, num_bl_layers=10, near_wall_spacing=1e-4, bl
 
     INPUTS:
         surfmesh_ugrid_path: str, path to .ugrid surface mesh file to exrude
+        check_surface: bool, fail fast if the surface mesh is not watertight/manifold (see UMesh.check_surface), instead of inside extrude
 
     OUTPUTS: 
         
@@ -32,15 +33,24 @@ def gen_blmesh(surfmesh_ugrid_path, num_bl_layers=10, near_wall_spacing=1e-4, bl
     if not surfmesh_ugrid_path.endswith('.ugrid'):
         raise TypeError('input must be a .ugrid')
 
+    # surface checking, extrude tends to fail (or segfault) late and unhelpfully on bad surfaces
+    if check_surface:
+        report = UMesh(surfmesh_ugrid_path).check_surface()
+        if not report['ok']:
+            problems = '\n'.join(f'  {key}: {report[key].shape[0]}, e.g. at {report[key][:3].tolist()}' 
+                                 for key in ['boundary_edges', 'nonmanifold_edges', 'inconsistent_edges', 'duplicate_faces', 'nonmanifold_vertices'] 
+                                 if report[key].shape[0])
+            raise Exception(f'Surface mesh {surfmesh_ugrid_path} failed watertightness/manifoldness check:\n{problems}')
+
     # paths
     base_dir = os.getcwd()
     work_dir = os.path.dirname(surfmesh_ugrid_path) # forcing to build mesh location for now
     
     surfmesh_stem   = Path(surfmesh_ugrid_path).stem
     blmesh_ugrid    = f'{surfmesh_stem}_BLMESH.ugrid'
-    blmesh_vtk      = f'{surfmesh_stem}_BLMESH.vtk'
+    blmesh_vtu      = f'{surfmesh_stem}_BLMESH.vtu'
     blmesh_ugrid_path   = os.path.join(work_dir, blmesh_ugrid)
-    blmesh_vtk_path     = os.path.join(work_dir, blmesh_vtk)
+    blmesh_vtu_path     = os.path.join(work_dir, blmesh_vtu)
     
     # generate layer spacing
     layers = [near_wall_spacing]
@@ -73,16 +83,13 @@ def gen_blmesh(surfmesh_ugrid_path, num_bl_layers=10, near_wall_spacing=1e-4, bl
     result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
     print(result.stdout); print(result.stderr)
 
-    # hacky vtk conversion, since its better at visualization than GMSH
-    if write_vtk:
-        print(f'Converting BL mesh to VTK using meshio (workaround)...\n')   
-        cmd = f'meshio convert {blmesh_ugrid} {blmesh_vtk}'
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        print(result.stdout); print(result.stderr) 
-
     # Read in resultant mesh            
     BLMesh = UMesh(blmesh_ugrid)
 
+    # vtk output, since its better at visualization than GMSH
+    if write_vtk:
+        BLMesh.write(blmesh_vtu)
+
     # Change back to base dir
     os.chdir(base_dir)
 
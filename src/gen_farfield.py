@@ -1,4 +1,5 @@
 import os
+import time
 import math
 import csv
 import subprocess
@@ -7,12 +8,24 @@ import gmsh
 import numpy as np
 
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 
-from .gmsh_helpers import sphere_surf, collect_size_fields
+from .gmsh_helpers import sphere_surf, collect_size_fields, physical_surface_to_umesh, umesh_to_gmsh, model_to_umesh
+from .farfield_templates import farfield_template as get_farfield_template, FARFIELD_TAG
 from .ugrid_tools import UMesh
+from scipy.spatial import KDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 
-def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.5, numthreads=4, size_fields_dict={}):
+# physical/elementary tags of the interface spheres between farfield shells (see gen_farfield_shells)
+SHELL_INTERFACE_TAG = 100
+# physical/elementary tag of the frozen cavity boundary for local remeshing (see regen_farfield_local)
+CAVITY_TAG = 200
+
+
+def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.5, numthreads=4, size_fields_dict={}, num_shells=1, shell_radii=None, farfield_template=None, volmesh_msh_path=None):
     '''
     TODO: 
         - I TRIED TO MAKE THIS WORK WITH OPENCASCADE BUT WAS HAVING ISSUES. AM PROBABLY JUST DUMB. TRY AGAIN LATER
@@ -23,7 +36,14 @@ def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.
         - Do in tempdir? Add file cleanup functionality?
 
     INPUTS:
-        bl_msh_path: str, path to .msh formatted boundary layer mesh (from gen_blmesh.py)
+        bl_msh_path: str, path to .msh formatted boundary layer mesh (from gen_blmesh.py), or the BL UMesh itself, which is loaded
+            into gmsh through the api, so its .msh doesn't have to be written first
+        num_shells: int, if > 1, split the farfield into concentric spherical shells meshed in parallel processes (see gen_farfield_shells)
+        shell_radii: list of float, optional explicit radii of the interfaces between shells (overrides num_shells)
+        farfield_template: str, optional, use a cached precomputed outer boundary ('sphere', 'box', 'cylinder', see farfield_templates.py) 
+            of size farfield_radius, instead of building/meshing the sphere every run
+        volmesh_msh_path: str, where to write the volume mesh .msh. Defaults to <bl_msh_path stem>_VOLMESH.msh, 
+            and to not writing it at all for UMesh inputs (e.g. to write it in the background, see pipeline.py)
 
     OUTPUTS:
         VolMesh: UMesh, volume mesh (boundary layer + farfield)
@@ -62,7 +82,415 @@ def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.
     '''
 
     # paths
-    volmesh_msh = os.path.splitext(bl_msh_path)[0]+'_VOLMESH.msh'
+    volmesh_msh = volmesh_msh_path
+    if volmesh_msh is None and not isinstance(bl_msh_path, UMesh):
+        volmesh_msh = os.path.splitext(bl_msh_path)[0]+'_VOLMESH.msh'
+
+    # precomputed outer boundary, if requested
+    FarfieldTemplate = None
+    if farfield_template:
+        FarfieldTemplate = get_farfield_template(farfield_template, farfield_radius, farfield_Lc, numthreads=numthreads)
+
+    if num_shells > 1 or shell_radii:
+        return gen_farfield_shells(bl_msh_path, volmesh_msh, farfield_radius, farfield_Lc, extend_power, numthreads, size_fields_dict, num_shells, shell_radii, FarfieldTemplate)
+
+    if FarfieldTemplate is None:
+        VolMesh = mesh_farfield_shell(bl_msh_path, volmesh_msh, inner_surf=1, outer_surf=None, is_innermost=True, 
+                            farfield_radius=farfield_radius, farfield_Lc=farfield_Lc, extend_power=extend_power, 
+                            numthreads=numthreads, size_fields_dict=size_fields_dict)
+    else:
+        # template is loaded as a discrete surface alongside the BL mesh
+        VolMesh = mesh_farfield_shell(bl_msh_path, volmesh_msh, inner_surf=1, outer_surf=FARFIELD_TAG, is_innermost=True, 
+                            farfield_radius=farfield_radius, farfield_Lc=farfield_Lc, extend_power=extend_power, 
+                            numthreads=numthreads, size_fields_dict=size_fields_dict, outer_physical_group=FARFIELD_TAG,
+                            surface_meshes=[FarfieldTemplate])
+
+    return VolMesh
+
+
+
+def gen_farfield_shells(bl_msh_path, volmesh_msh, farfield_radius, farfield_Lc, extend_power, numthreads, size_fields_dict, num_shells, shell_radii=None, FarfieldTemplate=None):
+    '''
+    Parallel farfield meshing by decomposing the farfield into concentric spherical shells, each meshed in its own process.
+
+    1. The interface spheres between shells are surface meshed once, up front, at the element size the volume mesh is 
+       estimated to have there (see farfield_element_counts), min'd with the same size fields as the volume
+    2. Each shell is meshed independently against those (discrete, so frozen) interface meshes
+    3. Shells are merged back into one conformal UMesh by merging the coincident interface nodes
+
+    NOTES:
+        - Octant-type decompositions aren't used since the cutting planes would have to go through the BL mesh
+        - The BL mesh is merged into every shell model, only so the Extend size field (off of the BL top-cap) is identical across shells.
+          Interfaces (and FarfieldTemplate) are loaded alongside it through the gmsh api, so the BL mesh never round-trips through python
+        - Default interface radii split the farfield into shells of ~equal estimated element count (see farfield_element_counts),
+          since elements are much finer near the body. All of the region within 1.1x the BL extents has to go to the innermost shell though,
+          and that's usually the densest part of the mesh, so the speedup is bounded by its share of the elements (printed), and 
+          more shells only help until the innermost one dominates. Per-shell setup (gmsh init, BL mesh merge, .msh write/read) also adds up
+        - numthreads is split across the shell processes in proportion to their estimated element counts
+        - Shell processes are spawned, not forked, so this is safe to call with other threads running (e.g. MeshPipeline I/O),
+          but the calling script needs an `if __name__ == '__main__':` guard
+        - If given, FarfieldTemplate (UMesh) is used as the outer boundary of the outermost shell, instead of building the sphere
+        - The merged volume mesh is only returned, not written to volmesh_msh (only the per-shell .msh files are written, 
+          next to it, if volmesh_msh is given)
+    '''
+
+    # BL mesh, for the extents/default radii
+    BLMesh = bl_msh_path if isinstance(bl_msh_path, UMesh) else UMesh(bl_msh_path)
+    bl_radius = np.max(np.linalg.norm(BLMesh.nodes, axis=1))
+
+    # estimated element count inside radius r, for balancing
+    r_grid, r_counts, r_sizes = farfield_element_counts(BLMesh, farfield_radius, farfield_Lc, extend_power, size_fields_dict)
+
+    if shell_radii:
+        shell_radii = sorted(shell_radii)
+    else:
+        targets = r_counts[-1]*np.arange(1, num_shells)/num_shells
+        shell_radii = np.unique(np.clip(np.interp(targets, r_counts, r_grid), 1.1*bl_radius, None)).tolist()
+
+    if shell_radii[0] <= bl_radius or shell_radii[-1] >= farfield_radius:
+        raise Exception(f'Shell radii must be between the BL mesh extents ({bl_radius}) and the farfield radius ({farfield_radius})')
+
+    num_shells = len(shell_radii)+1
+
+    # threads per shell, proportional to estimated element count
+    shell_counts = np.diff(np.interp([0]+shell_radii+[farfield_radius], r_grid, r_counts))
+    shell_numthreads = np.maximum(1, np.round(numthreads*shell_counts/shell_counts.sum())).astype(int).tolist()
+
+    print(f'Meshing farfield as {num_shells} shells, interface radii: {shell_radii}')
+    print(f'Estimated share of elements per shell: {np.round(shell_counts/shell_counts.sum(), 3).tolist()}, threads per shell: {shell_numthreads}')
+
+    # mesh interface spheres
+    interface_tags = [SHELL_INTERFACE_TAG+i for i in range(len(shell_radii))]
+    interface_lcs = np.interp(shell_radii, r_grid, r_sizes).tolist()
+    Interfaces = mesh_shell_interfaces(bl_msh_path, shell_radii, interface_lcs, interface_tags, farfield_radius, farfield_Lc, extend_power, numthreads, size_fields_dict)
+
+    # surfaces for each shell: bounding interface spheres (the BL mesh is loaded from bl_msh_path in each shell process)
+    shell_args = []
+    for i_shell in range(num_shells):
+        surface_meshes = Interfaces[max(i_shell-1, 0):i_shell+1]
+        if i_shell == num_shells-1 and FarfieldTemplate is not None:
+            surface_meshes = surface_meshes + [FarfieldTemplate]
+
+        shell_out_msh = None if volmesh_msh is None else f'{os.path.splitext(volmesh_msh)[0]}_SHELL{i_shell}.msh'
+
+        inner_surf = 1 if i_shell == 0 else interface_tags[i_shell-1]
+        outer_surf = None if i_shell == num_shells-1 else interface_tags[i_shell]
+        outer_physical_group = None
+        if i_shell == num_shells-1 and FarfieldTemplate is not None:
+            outer_surf = outer_physical_group = FARFIELD_TAG
+        shell_args.append(dict(in_mesh=bl_msh_path, out_msh_path=shell_out_msh, inner_surf=inner_surf, outer_surf=outer_surf, 
+                               is_innermost=(i_shell == 0), outer_physical_group=outer_physical_group, surface_meshes=surface_meshes))
+
+    # mesh shells in parallel 
+    with ProcessPoolExecutor(num_shells, mp_context=get_context('spawn')) as pool:
+        futures = [pool.submit(mesh_farfield_shell, **args, farfield_radius=farfield_radius, farfield_Lc=farfield_Lc, extend_power=extend_power, 
+                               numthreads=numthreads_i, size_fields_dict=size_fields_dict) for args, numthreads_i in zip(shell_args, shell_numthreads)]
+        ShellMeshes = [future.result() for future in futures]
+
+    # merge shells (innermost first, so BL node numbering is retained)
+    VolMesh = ShellMeshes[0]
+    for ShellMesh in ShellMeshes[1:]:
+        VolMesh = VolMesh.merge(ShellMesh, tol=1e-9*farfield_radius)
+
+    return VolMesh
+
+
+
+def regen_farfield_local(VolMesh, bl_msh_path, changed_size_fields, previous_size_fields, size_fields_dict, farfield_radius=10, farfield_Lc=2, extend_power=0.5, numthreads=4, buffer=None, max_cavity_repairs=10):
+    '''
+    Incremental farfield update for when only some size fields change. Rather than regenerating the whole farfield,
+    tets in the changed size field regions (plus a buffer) are deleted, and only that cavity is re-meshed against its 
+    (frozen) boundary, and spliced back in.
+
+    INPUTS:
+        VolMesh: UMesh, previous volume mesh (from gen_farfield)
+        bl_msh_path: str, path to .msh formatted boundary layer mesh VolMesh was built from (needed for the Extend field), or its UMesh
+        changed_size_fields: dict, the changed/added entries of size_fields_dict (new parameters). Supports Ball, Cylinder, Box
+        previous_size_fields: dict, the same entries with their previous parameters (omit added fields). The cavity is the union 
+            of the old and new regions, so refinement left behind by a moved/shrunk field is re-meshed too
+        size_fields_dict: dict, full (new) size fields, as passed to gen_farfield 
+        buffer: float, distance the cavity is grown beyond the size field regions. 
+            Defaults to twice the largest existing tet edge in the regions, so sizes can transition back to the existing mesh
+        max_cavity_repairs: int, max number of times the cavity is grown to make its boundary manifold, before giving up
+
+    OUTPUTS:
+        VolMesh: UMesh, updated volume mesh
+
+    NOTES:
+        - Only farfield tets (tag 61) are re-meshed, the BL mesh is never touched. VolMesh must carry those tags, 
+          i.e. be the gen_farfield output (or read from its .msh), not read from a .ugrid (volume tags aren't stored there)
+        - The other inputs must match the ones of the gen_farfield call VolMesh came from
+        - The cavity boundary is checked (UMesh.check_surface) before meshing. Pockets of tets enclosed by the cavity, and the tets around
+          non-manifold edges/vertices (e.g. two regions touching along an edge), are added to the cavity until it is a closed manifold
+    '''
+
+    print(f'Locally re-meshing farfield for size fields: {list(changed_size_fields.keys())}')
+
+    farfield_tets = (VolMesh.tets['tags'].ravel() == 61) # FARFIELD MESH VOLUME
+    if not np.any(farfield_tets):
+        raise Exception('No farfield (tag 61) tets in VolMesh, it must come from gen_farfield or its .msh (a .ugrid has no volume tags)')
+
+    tets = VolMesh.tets['defs'].astype(np.int64) - 1
+    tet_centroids = VolMesh.nodes[tets].mean(axis=1)
+
+    # old and new regions of each changed field
+    regions = list(changed_size_fields.items()) + list(previous_size_fields.items())
+
+    if buffer is None:
+        in_regions = np.zeros(VolMesh.num_tets, dtype=bool)
+        for size_field, params in regions:
+            in_regions |= size_field_region(tet_centroids, size_field, params, 0.0)
+        edges = VolMesh.nodes[tets[in_regions][:, [0,0,0,1,1,2]]] - VolMesh.nodes[tets[in_regions][:, [1,2,3,2,3,3]]]
+        buffer = 2*np.max(np.linalg.norm(edges, axis=2), initial=0.0)
+
+    in_cavity = np.zeros(VolMesh.num_tets, dtype=bool)
+    for size_field, params in regions:
+        in_cavity |= size_field_region(tet_centroids, size_field, params, buffer)
+    in_cavity &= farfield_tets
+
+    if not np.any(in_cavity):
+        print('No tets in changed size field regions, nothing to re-mesh')
+        return VolMesh
+
+    # repair the cavity until its boundary is a closed manifold (centroid selection leaves pockets and pinches)
+    for i_repair in range(max_cavity_repairs+1):
+        fill_cavity_pockets(VolMesh, tets, in_cavity, farfield_tets)
+        Cavity, bdr_nodes = cavity_surface(VolMesh, tets, in_cavity)
+        report = Cavity.check_surface()
+        if report['ok']:
+            break
+
+        # grow the cavity by the tets around the problem nodes
+        problem_points = np.concatenate([report[key].reshape(-1, 3) for key in ['boundary_edges', 'nonmanifold_edges', 'inconsistent_edges', 'nonmanifold_vertices']])
+        _, problem_nodes = KDTree(Cavity.nodes).query(problem_points)
+        grow = farfield_tets & ~in_cavity & np.any(np.isin(tets, bdr_nodes[problem_nodes]), axis=1)
+        if i_repair == max_cavity_repairs or not np.any(grow):
+            problems = '\n'.join(f'  {key}: {report[key].shape[0]}, e.g. at {report[key][:3].tolist()}' 
+                                 for key in ['boundary_edges', 'nonmanifold_edges', 'inconsistent_edges', 'duplicate_faces', 'nonmanifold_vertices'] 
+                                 if report[key].shape[0])
+            raise Exception(f'Could not repair local re-meshing cavity into a closed manifold:\n{problems}')
+        print(f'Growing cavity by {np.count_nonzero(grow)} tets around {np.unique(problem_nodes).size} non-manifold nodes')
+        in_cavity |= grow
+
+    print(f'Re-meshing cavity of {np.count_nonzero(in_cavity)} tets (buffer: {buffer})')
+
+    # mesh cavity, alongside the BL mesh for the Extend field
+    cavity_out_msh = None if isinstance(bl_msh_path, UMesh) else f'{os.path.splitext(bl_msh_path)[0]}_CAVITY.msh'
+    CavityMesh = mesh_farfield_shell(bl_msh_path, cavity_out_msh, inner_surf=None, outer_surf=CAVITY_TAG, is_innermost=False, 
+                        farfield_radius=farfield_radius, farfield_Lc=farfield_Lc, extend_power=extend_power, 
+                        numthreads=numthreads, size_fields_dict=size_fields_dict, surface_meshes=[Cavity])
+
+    # splice: drop cavity tets (and their now-orphaned interior nodes), merge in new tets along the cavity boundary
+    KeptMesh = UMesh()
+    KeptMesh.nodes = VolMesh.nodes
+    for el_type in VolMesh.iter_elem_type_strs:
+        setattr(KeptMesh, el_type, dict(getattr(VolMesh, el_type)))
+    KeptMesh.tets = {'defs': VolMesh.tets['defs'][~in_cavity], 'tags': VolMesh.tets['tags'][~in_cavity]}
+    KeptMesh.remove_unused_nodes()
+
+    return KeptMesh.merge(CavityMesh, tol=1e-9*farfield_radius)
+
+
+
+def cavity_surface(VolMesh, tets, in_cavity):
+    '''
+    Boundary of the in_cavity tets: tet faces (outward oriented) appearing only once within the cavity
+
+    OUTPUTS:
+        Cavity: UMesh, triangulated cavity boundary, tagged CAVITY_TAG
+        bdr_nodes: VolMesh node indices (0-indexed) of the Cavity nodes
+    '''
+    faces = tets[in_cavity][:, [[0,2,1], [0,1,3], [0,3,2], [1,2,3]]].reshape(-1, 3)
+    _, face_inverse, face_counts = np.unique(np.sort(faces, axis=1), axis=0, return_inverse=True, return_counts=True)
+    bdr_faces = faces[face_counts[face_inverse.ravel()] == 1]
+
+    bdr_nodes, bdr_defs = np.unique(bdr_faces, return_inverse=True)
+    Cavity = UMesh()
+    Cavity.nodes = VolMesh.nodes[bdr_nodes]
+    Cavity.tris['defs'] = (bdr_defs.reshape(-1, 3) + 1).astype(np.uint32)
+    Cavity.tris['tags'] = np.full((Cavity.num_tris, 1), CAVITY_TAG, dtype=np.uint32)
+    return Cavity, bdr_nodes
+
+
+
+def fill_cavity_pockets(VolMesh, tets, in_cavity, farfield_tets):
+    '''
+    Adds groups of (face-connected) farfield tets that are completely enclosed by the cavity to it, in place
+    '''
+    # only tets within the cavity bounding box can be enclosed
+    cavity_nodes = VolMesh.nodes[tets[in_cavity]].reshape(-1, 3)
+    tet_nodes = VolMesh.nodes[tets]
+    candidates = farfield_tets & ~in_cavity & np.all((tet_nodes >= cavity_nodes.min(axis=0)) & (tet_nodes <= cavity_nodes.max(axis=0)), axis=(1,2))
+    if not np.any(candidates):
+        return
+
+    # faces of cavity + candidate tets. Candidate faces not shared within that set lead out of the cavity (or are domain boundary)
+    subset = np.flatnonzero(in_cavity | candidates)
+    faces = np.sort(tets[subset][:, [[0,2,1], [0,1,3], [0,3,2], [1,2,3]]].reshape(-1, 3), axis=1)
+    face_tets = np.repeat(subset, 4)
+    _, face_inverse, face_counts = np.unique(faces, axis=0, return_inverse=True, return_counts=True)
+    face_inverse = face_inverse.ravel()
+
+    leaking = np.zeros(VolMesh.num_tets, dtype=bool)
+    leaking[face_tets[face_counts[face_inverse] == 1]] = True
+
+    # face-adjacent pairs of candidate tets (shared faces are consecutive once sorted by face)
+    order = np.argsort(face_inverse, kind='stable')
+    pairs = face_tets[order][face_counts[face_inverse[order]] == 2].reshape(-1, 2)
+    pairs = pairs[np.all(candidates[pairs], axis=1)]
+
+    candidate_idx = np.flatnonzero(candidates)
+    local_idx = np.zeros(VolMesh.num_tets, dtype=np.int64)
+    local_idx[candidate_idx] = np.arange(candidate_idx.size)
+    graph = coo_matrix((np.ones(pairs.shape[0]), (local_idx[pairs[:,0]], local_idx[pairs[:,1]])), shape=(candidate_idx.size, candidate_idx.size))
+    num_groups, labels = connected_components(graph, directed=False)
+
+    group_leaks = np.zeros(num_groups, dtype=bool)
+    group_leaks[labels[leaking[candidate_idx]]] = True
+    pockets = candidate_idx[~group_leaks[labels]]
+    if pockets.size:
+        print(f'Adding {pockets.size} tets enclosed by the cavity')
+        in_cavity[pockets] = True
+
+
+
+def size_field_region(points, size_field, params, buffer):
+    '''
+    Returns mask of points within the region (grown by buffer) affected by a gmsh size field, using gmsh's parameter defaults
+    '''
+    center = np.array([params.get('XCenter', 0.0), params.get('YCenter', 0.0), params.get('ZCenter', 0.0)])
+
+    match size_field:
+        case 'Ball':
+            radius = params.get('Radius', 0.0) + params.get('Thickness', 0.0) + buffer
+            return np.linalg.norm(points - center, axis=1) <= radius
+
+        case 'Cylinder':
+            # gmsh cylinder extends +-axis from center
+            axis = np.array([params.get('XAxis', 0.0), params.get('YAxis', 0.0), params.get('ZAxis', 1.0)])
+            axis_len = np.linalg.norm(axis)
+            rel = points - center
+            axial = rel @ (axis/axis_len)
+            radial = np.linalg.norm(rel - np.outer(axial, axis/axis_len), axis=1)
+            return (np.abs(axial) <= axis_len + buffer) & (radial <= params.get('Radius', 0.5) + buffer)
+
+        case 'Box':
+            grow = params.get('Thickness', 0.0) + buffer
+            lo = np.array([params.get('XMin', 0.0), params.get('YMin', 0.0), params.get('ZMin', 0.0)]) - grow
+            hi = np.array([params.get('XMax', 0.0), params.get('YMax', 0.0), params.get('ZMax', 0.0)]) + grow
+            return np.all((points >= lo) & (points <= hi), axis=1)
+
+        case _:
+            raise Exception(f'Local re-meshing region not implemented for {size_field} size fields')
+
+
+
+def farfield_element_counts(BLMesh, farfield_radius, farfield_Lc, extend_power, size_fields_dict, num_radii=200, num_dirs=400):
+    '''
+    Estimated number of farfield elements within radius r, as the integral of 4*pi*r^2 * <1/h^3> dr, where <> averages
+    over directions on the sphere (points inside the body excluded). Used to balance the shells in gen_farfield_shells.
+
+    h is the farfield size field (see add_farfield_size_fields): gmsh's Extend field off of the BL top cap,
+        h = f*SizeBnd + (1-f)*farfield_Lc,   f = ((farfield_radius - d)/farfield_radius)^extend_power
+    with d the distance to the top cap and SizeBnd the local top cap edge length, min'd with VIn inside any Ball, Cylinder or 
+    Box size fields (other size field types are not accounted for). Meshed tets follow this closely (mean edge ~1.4x h).
+
+    OUTPUTS:
+        r: (num_radii,) radii, from 0 to farfield_radius
+        counts: (num_radii,) estimated (relative) element counts within each radius
+        sizes: (num_radii,) estimated smallest element size on the sphere of each radius
+    '''
+    topcap = BLMesh.tris['defs'][BLMesh.tris['tags'].ravel() == 1].astype(np.int64) - 1
+    topcap_pts = BLMesh.nodes[topcap]
+
+    # top cap node sizes (average length of the edges of the faces around each node), and normals, oriented outward (positive enclosed volume)
+    face_sizes = np.mean(np.linalg.norm(topcap_pts - np.roll(topcap_pts, 1, axis=1), axis=2), axis=1)
+    face_normals = np.cross(topcap_pts[:,1] - topcap_pts[:,0], topcap_pts[:,2] - topcap_pts[:,0])
+    face_normals *= np.sign(np.sum(face_normals*topcap_pts.mean(axis=1)))
+    node_sizes = np.zeros(BLMesh.num_nodes)
+    node_faces = np.zeros(BLMesh.num_nodes)
+    node_normals = np.zeros_like(BLMesh.nodes)
+    for i_vert in range(3):
+        np.add.at(node_sizes, topcap[:, i_vert], face_sizes)
+        np.add.at(node_faces, topcap[:, i_vert], 1)
+        np.add.at(node_normals, topcap[:, i_vert], face_normals)
+
+    # fibonacci sphere directions
+    i_dir = np.arange(num_dirs) + 0.5
+    phi, theta = np.arccos(1 - 2*i_dir/num_dirs), np.pi*(1 + 5**0.5)*i_dir
+    dirs = np.stack((np.cos(theta)*np.sin(phi), np.sin(theta)*np.sin(phi), np.cos(phi)), axis=1)
+
+    # distance to top cap, points behind their closest top cap node are inside the body
+    r = np.linspace(0, farfield_radius, num_radii)
+    points = (r[:, None, None]*dirs[None, :, :]).reshape(-1, 3)
+    topcap_nodes = np.unique(topcap)
+    dist, closest = KDTree(BLMesh.nodes[topcap_nodes]).query(points)
+    closest = topcap_nodes[closest]
+    inside = np.sum((points - BLMesh.nodes[closest])*node_normals[closest], axis=1) < 0
+
+    # Extend field, min'd with the additional size fields
+    f = np.clip((farfield_radius - dist)/farfield_radius, 0.0, 1.0)**extend_power
+    h = f*node_sizes[closest]/node_faces[closest] + (1 - f)*farfield_Lc
+    for size_field, params in size_fields_dict.items():
+        if size_field in ('Ball', 'Cylinder', 'Box') and 'VIn' in params:
+            h = np.where(size_field_region(points, size_field, params, 0.0), np.minimum(h, params['VIn']), h)
+    h = h.reshape(num_radii, num_dirs)
+
+    density = 4*np.pi*r**2 * np.mean(np.where(inside.reshape(num_radii, num_dirs), 0.0, 1/h**3), axis=1)
+    counts = np.concatenate(([0.0], np.cumsum(0.5*(density[1:] + density[:-1])*np.diff(r))))
+    return r, counts, np.min(h, axis=1)
+
+
+
+def mesh_shell_interfaces(bl_msh_path, radii, lcs, physical_groups, farfield_radius, farfield_Lc, extend_power, numthreads, size_fields_dict):
+    '''
+    Surface meshes spheres of given radii and (point) sizes lcs, under the same size fields as the farfield volume mesh
+
+    OUTPUTS:
+        Interfaces: list of UMesh, one triangulated sphere per radius, tagged with corresponding physical group
+    '''
+
+    gmsh.initialize()
+    gmsh.option.setNumber('Geometry.Tolerance', 1e-16)
+    gmsh.option.setNumber("General.NumThreads", numthreads)
+    gmsh.model.add("interfaces")
+
+    # BL mesh needed for the Extend field
+    load_bl_mesh(bl_msh_path)
+
+    for i, (radius, lc, physical_group) in enumerate(zip(radii, lcs, physical_groups)):
+        sphere_surf(x=0, y=0, z=0, r=radius, lc=lc, surf_tag=50+i, physical_group=physical_group)
+
+    add_farfield_size_fields(farfield_radius, farfield_Lc, extend_power, size_fields_dict)
+    gmsh.model.mesh.generate(2)
+
+    Interfaces = [physical_surface_to_umesh(physical_group, physical_group) for physical_group in physical_groups]
+    gmsh.finalize()
+
+    return Interfaces
+
+
+
+def mesh_farfield_shell(in_mesh, out_msh_path, inner_surf, outer_surf, is_innermost, farfield_radius, farfield_Lc, extend_power, numthreads, size_fields_dict, outer_physical_group=None, surface_meshes=()):
+    '''
+    Meshes the volume between two closed surfaces of in_mesh (expected to contain the BL mesh) and surface_meshes, 
+    and writes it to out_msh_path
+    
+    INPUTS:
+        in_mesh: str or UMesh, .msh path or UMesh of the BL mesh (see load_bl_mesh)
+        out_msh_path: str, if None the mesh is only returned
+        inner_surf: int, elementary tag of the inner surface (1 for the BL top cap), if None the volume is bounded by outer_surf only
+        outer_surf: int, elementary tag of the outer surface, if None the farfield sphere is built
+        is_innermost: bool, if True the BL mesh and wall are included in the output
+        outer_physical_group: int, optional physical group for outer_surf, so it is included in the output (e.g. farfield templates)
+        surface_meshes: list of UMesh, additional discrete surfaces (e.g. shell interfaces, farfield templates), one per element tag, 
+            loaded into the model through the gmsh api (see umesh_to_gmsh)
+
+    OUTPUTS:
+        Mesh: UMesh, the output mesh, taken straight from the gmsh model (same as reading out_msh_path back)
+    '''
+
+    start_time = time.time()
 
     # init gmsh    
     gmsh.initialize()
@@ -70,20 +498,32 @@ def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.
     gmsh.option.setNumber("General.NumThreads", numthreads)
     gmsh.model.add("model_1")
 
-    # merge in BL mesh file
-    gmsh.merge(bl_msh_path)
+    # merge in BL mesh
+    # (physical groups read from the .msh are dropped, only the ones assigned below are written out)
+    load_bl_mesh(in_mesh)
+    gmsh.model.removePhysicalGroups()
+    for SurfMesh in surface_meshes:
+        umesh_to_gmsh(SurfMesh)
     
     # make surface loop based on the tagged surfaces of the blmesh
     # (expected: 0 is the geometric/wall surface, 1 is the "top cap" of the Bl mesh, but I don't think that is 100% guaranteed)
     # syntax: surfaceTags (vector of integers), tag (integer) 
-    eltag_surf_wall      = gmsh.model.geo.addSurfaceLoop([0], 1) 
-    eltag_surf_bl_topcap = gmsh.model.geo.addSurfaceLoop([1], 2) 
+    if is_innermost:
+        eltag_surf_wall  = gmsh.model.geo.addSurfaceLoop([0], 1) 
+    if inner_surf is not None:
+        eltag_surf_inner = gmsh.model.geo.addSurfaceLoop([inner_surf], 2) 
     
     # Create Farfield extents
-    eltag_surf_sphere = sphere_surf(x=0, y=0, z=0, r=farfield_radius, lc=farfield_Lc, surf_tag=50, physical_group=3)
+    if outer_surf is None:
+        eltag_surf_outer = sphere_surf(x=0, y=0, z=0, r=farfield_radius, lc=farfield_Lc, surf_tag=50, physical_group=3)
+    else:
+        eltag_surf_outer = gmsh.model.geo.addSurfaceLoop([outer_surf], 50)
 
-    # Create Farfield volume (between SPHERE farfield extent and BLMESH outer-interface)
-    eltag_vol_farfield = gmsh.model.geo.addVolume([eltag_surf_sphere, eltag_surf_bl_topcap], 60)
+    # Create Farfield volume (between outer extent and inner surface, i.e. BLMESH outer-interface)
+    if inner_surf is not None:
+        eltag_vol_farfield = gmsh.model.geo.addVolume([eltag_surf_outer, eltag_surf_inner], 60)
+    else:
+        eltag_vol_farfield = gmsh.model.geo.addVolume([eltag_surf_outer], 60)
     
     # have to synchronize before physical groups
     gmsh.model.geo.remove_all_duplicates() #not sure if necessary
@@ -92,29 +532,14 @@ def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.
     # assign physical groups
     # reminder: all meshes in gmsh must have physical group or will not be written (unless you use the write_all_elements flag in gmsh)
     # syntax: dim (integer), tags (vector of integers for model entities), tag (integer for physical surface tag), name (string) 
-    phystag_surf_wall    = gmsh.model.addPhysicalGroup(2, [0], 1)
-    phystag_vol_bl       = gmsh.model.addPhysicalGroup(3, [0], 1)   # FOR THIS BL MESH VOLUME- I ARBITRARILY SET THIS TO 0 IN UGRID READER
+    if is_innermost:
+        phystag_surf_wall    = gmsh.model.addPhysicalGroup(2, [0], 1)
+        phystag_vol_bl       = gmsh.model.addPhysicalGroup(3, [0], 1)   # FOR THIS BL MESH VOLUME- I ARBITRARILY SET THIS TO 0 IN UGRID READER
     phystag_vol_farfield = gmsh.model.addPhysicalGroup(3, [60], 61) # FARFIELD MESH VOLUME
+    if outer_surf is not None and outer_physical_group is not None:
+        phystag_surf_outer = gmsh.model.addPhysicalGroup(2, [outer_surf], outer_physical_group)
 
-    # Extend size field, see extend_field.py example
-    #   Can't figure out how to get this field to act on sphere farfield. But we can just be kinda smart about 
-    #   how we set DistMax and SizeMax, relative to the sphere size to get basically the same result
-    f_extend = gmsh.model.mesh.field.add("Extend")
-    gmsh.model.mesh.field.setNumbers(f_extend, "SurfacesList", [1])
-    # # gmsh.model.mesh.field.setNumbers(f, "CurvesList", [e[1] for e in gmsh.model.getEntities(1)])    
-    gmsh.model.mesh.field.setNumber(f_extend, "DistMax", farfield_radius)
-    gmsh.model.mesh.field.setNumber(f_extend, "SizeMax", farfield_Lc)
-    gmsh.model.mesh.field.setNumber(f_extend, "Power", extend_power)
-
-    # Collect additional size fields
-    f_additional_size_fields = collect_size_fields(size_fields_dict)
-
-    # take min across all size fields
-    f_min_all = gmsh.model.mesh.field.add("Min")
-    gmsh.model.mesh.field.setNumbers(f_min_all, "FieldsList", [f_extend]+f_additional_size_fields)
-
-    # gmsh.model.mesh.field.setAsBackgroundMesh(f_extend)
-    gmsh.model.mesh.field.setAsBackgroundMesh(f_min_all)
+    add_farfield_size_fields(farfield_radius, farfield_Lc, extend_power, size_fields_dict)
 
     # Options
     gmsh.option.setNumber("Mesh.Algorithm3D", 10)
@@ -130,17 +555,56 @@ def gen_farfield(bl_msh_path, farfield_radius=10, farfield_Lc=2, extend_power=0.
     gmsh.model.mesh.remove_duplicate_elements()
 
     # Remove interface
-    gmsh.model.mesh.removeElements(eltag_surf_bl_topcap, 1)
+    if inner_surf is not None:
+        gmsh.model.mesh.removeElements(2, inner_surf)
 
     # Save out
     # gmsh.option.setNumber("Mesh.SaveAll", 1)
-    gmsh.option.setNumber("Mesh.MshFileVersion", 2.2)
-    gmsh.write(volmesh_msh)
+    if out_msh_path is not None:
+        gmsh.option.setNumber("Mesh.MshFileVersion", 2.2)
+        gmsh.write(out_msh_path)
+    Mesh = model_to_umesh()
     gmsh.finalize()
 
-    # Read back into python as UMesh
-    VolMesh = UMesh(volmesh_msh)
+    print(f'Meshed {out_msh_path or "farfield"} ({numthreads} threads) in {time.time()-start_time}!\n')
+    return Mesh
 
-    return VolMesh
+
+
+def load_bl_mesh(bl_mesh):
+    '''
+    Loads the BL mesh into the current gmsh model, merging it from its .msh path, or through the gmsh api if a UMesh
+    '''
+    if isinstance(bl_mesh, UMesh):
+        umesh_to_gmsh(bl_mesh)
+    else:
+        gmsh.merge(bl_mesh)
+
+
+
+def add_farfield_size_fields(farfield_radius, farfield_Lc, extend_power, size_fields_dict):
+    '''
+    Sets the farfield background size field (Extend off of the BL top cap, min'd with any additional size fields) on the current gmsh model
+    '''
+
+    # Extend size field, see extend_field.py example
+    #   Can't figure out how to get this field to act on sphere farfield. But we can just be kinda smart about 
+    #   how we set DistMax and SizeMax, relative to the sphere size to get basically the same result
+    f_extend = gmsh.model.mesh.field.add("Extend")
+    gmsh.model.mesh.field.setNumbers(f_extend, "SurfacesList", [1])
+    # # gmsh.model.mesh.field.setNumbers(f, "CurvesList", [e[1] for e in gmsh.model.getEntities(1)])    
+    gmsh.model.mesh.field.setNumber(f_extend, "DistMax", farfield_radius)
+    gmsh.model.mesh.field.setNumber(f_extend, "SizeMax", farfield_Lc)
+    gmsh.model.mesh.field.setNumber(f_extend, "Power", extend_power)
+
+    # Collect additional size fields
+    f_additional_size_fields = collect_size_fields(size_fields_dict)
+
+    # take min across all size fields
+    f_min_all = gmsh.model.mesh.field.add("Min")
+    gmsh.model.mesh.field.setNumbers(f_min_all, "FieldsList", [f_extend]+f_additional_size_fields)
+
+    # gmsh.model.mesh.field.setAsBackgroundMesh(f_extend)
+    gmsh.model.mesh.field.setAsBackgroundMesh(f_min_all)
 
     
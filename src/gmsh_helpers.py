@@ -1,4 +1,7 @@
 import gmsh
+import numpy as np
+
+from .ugrid_tools import UMesh
 
 
 def sphere_surf(x, y, z, r, lc, surf_tag, physical_group):
@@ -69,8 +72,94 @@ def collect_size_fields(size_fields_dict):
         return gmsh_size_fields
 
 
-
-
-
-
-
+def physical_surface_to_umesh(physical_group, bc_tag):
+        # Pulls the (triangle) surface mesh of a 2D physical group out of the current gmsh model into a UMesh,
+        # with contiguous 1-indexed nodes and all faces tagged with bc_tag
+
+        node_tags, coords = gmsh.model.mesh.getNodesForPhysicalGroup(2, physical_group)
+        node_order = np.argsort(node_tags)
+
+        tri_node_tags = []
+        for surf in gmsh.model.getEntitiesForPhysicalGroup(2, physical_group):
+                _, el_node_tags = gmsh.model.mesh.getElementsByType(2, surf)
+                tri_node_tags.append(el_node_tags)
+        tri_node_tags = np.concatenate(tri_node_tags)
+
+        # gmsh node tags -> contiguous node numbering
+        tri_defs = node_order[np.searchsorted(node_tags, tri_node_tags, sorter=node_order)] + 1
+
+        SurfMesh = UMesh()
+        SurfMesh.nodes = np.asarray(coords, dtype=np.double).reshape(-1, 3)
+        SurfMesh.tris['defs'] = tri_defs.reshape(-1, 3).astype(np.uint32)
+        SurfMesh.tris['tags'] = np.full((SurfMesh.num_tris, 1), bc_tag, dtype=np.uint32)
+        return SurfMesh
+
+
+def umesh_to_gmsh(Mesh):
+        # Loads a UMesh into the current gmsh model through the api, the same as gmsh.merge() of its .msh would 
+        # (one discrete entity per dimension and element tag, nodes classified on the lowest dimension entity using them), 
+        # without the file round trip. Node/element numbers are offset past the ones already in the model, 
+        # so meshes can be loaded alongside each other (coincident nodes are not merged)
+
+        node_offset = gmsh.model.mesh.getMaxNodeTag()
+        element_offset = gmsh.model.mesh.getMaxElementTag()
+
+        # (dim, tag, gmsh element type, defs) for each tag of each element type, boundary first
+        blocks = []
+        for el_type, geom_data in zip(Mesh.iter_elem_type_strs, Mesh.iter_elem_data):
+                dim = 2 if el_type in ('tris', 'quads') else 3
+                tags = geom_data['tags'].ravel()
+                for tag in np.unique(tags):
+                        blocks.append((dim, int(tag), Mesh.gmsh_type_tags[el_type], geom_data['defs'][tags == tag].astype(np.int64) - 1))
+
+        # classify each node on the first entity that uses it
+        owner = np.full(Mesh.num_nodes, -1, dtype=np.int64)
+        for i_block, (dim, tag, _, defs) in enumerate(blocks):
+                nodes = np.unique(defs)
+                nodes = nodes[owner[nodes] < 0]
+                owner[nodes] = i_block
+
+        existing = set(gmsh.model.getEntities())
+        for i_block, (dim, tag, gmsh_type, defs) in enumerate(blocks):
+                if (dim, tag) not in existing:
+                        gmsh.model.addDiscreteEntity(dim, tag)
+                        existing.add((dim, tag))
+
+                nodes = np.flatnonzero(owner == i_block)
+                if nodes.size:
+                        gmsh.model.mesh.addNodes(dim, tag, nodes + 1 + node_offset, Mesh.nodes[nodes].ravel())
+
+        for dim, tag, gmsh_type, defs in blocks:
+                element_tags = element_offset + 1 + np.arange(defs.shape[0])
+                gmsh.model.mesh.addElementsByType(tag, gmsh_type, element_tags, (defs + 1 + node_offset).ravel())
+                element_offset += defs.shape[0]
+
+
+def model_to_umesh():
+        # Pulls the mesh of the physical groups of the current gmsh model into a UMesh, the same as writing it to .msh (v2) and 
+        # reading it back would give (elements tagged with their physical group, only nodes of those elements, ordered by node tag), 
+        # without the file round trip
+
+        Mesh = UMesh()
+        defs = {el_type: [] for el_type in Mesh.iter_elem_type_strs}
+        tags = {el_type: [] for el_type in Mesh.iter_elem_type_strs}
+        for dim, physical_group in gmsh.model.getPhysicalGroups():
+                for entity in gmsh.model.getEntitiesForPhysicalGroup(dim, physical_group):
+                        el_types, _, el_node_tags = gmsh.model.mesh.getElements(dim, entity)
+                        for gmsh_type, node_tags in zip(el_types, el_node_tags):
+                                if gmsh_type not in Mesh.gmsh_tag_types: continue
+                                el_type = Mesh.gmsh_tag_types[gmsh_type]
+                                defs[el_type].append(node_tags.reshape(-1, Mesh.el_type_node_counts[el_type]))
+                                tags[el_type].append(np.full((defs[el_type][-1].shape[0], 1), physical_group, dtype=np.uint32))
+
+        # gmsh node tags -> contiguous node numbering, over the used nodes
+        used_tags = np.unique(np.concatenate([block.ravel() for blocks in defs.values() for block in blocks] + [np.empty(0, dtype=np.uint64)]))
+        node_tags, coords, _ = gmsh.model.mesh.getNodes(returnParametricCoord=False)
+        node_order = np.argsort(node_tags)
+        Mesh.nodes = np.asarray(coords, dtype=np.double).reshape(-1, 3)[node_order[np.searchsorted(node_tags, used_tags, sorter=node_order)]]
+
+        for el_type, geom_data in zip(Mesh.iter_elem_type_strs, Mesh.iter_elem_data):
+                if defs[el_type]:
+                        geom_data['defs'] = (np.searchsorted(used_tags, np.concatenate(defs[el_type])) + 1).astype(np.uint32)
+                        geom_data['tags'] = np.concatenate(tags[el_type])
+        return Mesh
@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from .ugrid_tools import UMesh
+
+
+class MeshPipeline:
+    '''
+    Runs the meshing workflow with mesh reads/writes overlapped on a background I/O executor, so e.g. the BL mesh 
+    .msh/.vtu outputs and the final volume mesh writes don't hold up the next stage.
+
+    Every stage returns a future. Any futures passed as arguments to a later stage are waited on first, so a stage 
+    starts as soon as its inputs are in memory (or on disk, for stages taking paths, e.g. gen_blmesh).
+
+    NOTES:
+        - Compute stages (run) are executed in the calling thread, since gmsh has to be run from the main thread, 
+          so they return already finished futures. What overlaps is the I/O with the compute stages
+        - Pass meshes between compute stages in memory where possible (e.g. the BL UMesh to gen_farfield, rather than its .msh path), 
+          otherwise the next stage has to wait on the write
+        - read/write paths are made absolute up-front, since gen_blmesh changes the working directory while running
+        - See example_pipeline.py
+
+    Example:
+        with MeshPipeline() as pipe:
+            SurfMesh = pipe.read('resource/rocket_stubby_surf.msh')
+            surf_ugrid = pipe.write(SurfMesh, 'resource/rocket_stubby_surf.ugrid')
+            BLMesh = pipe.run('gen_blmesh', gen_blmesh, surf_ugrid, num_bl_layers=10)
+            pipe.write(BLMesh, 'resource/rocket_stubby_BLMESH.msh')                   # these overlap with gen_farfield
+            pipe.write(BLMesh, 'resource/rocket_stubby_BLMESH.vtu')
+            VolMesh = pipe.run('gen_farfield', gen_farfield, BLMesh, farfield_radius=15)
+            pipe.write(VolMesh, 'resource/rocket_stubby_VOLMESH_FINAL.ugrid')
+        print(pipe.timeline())
+    '''
+
+    def __init__(self, io_workers=2):
+        self.io_pool = ThreadPoolExecutor(io_workers)
+        self.io_futures = []
+        self.start_time = time.time()
+        self.events = []    # (stage name, executor, start, end), relative to start_time
+        self.events_lock = threading.Lock()
+
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # already failing, let the queued I/O finish but don't mask the original error with an I/O one
+            self.io_pool.shutdown()
+
+
+    def run(self, name, fn, *args, **kwargs):
+        '''
+        Compute stage: waits on any future inputs, then runs fn(*args, **kwargs) in the calling thread
+        '''
+        future = Future()
+        future.set_result(self.timed(name, 'compute', fn, *args, **kwargs))
+        return future
+
+
+    def read(self, infile):
+        '''
+        Background read of a mesh file to a UMesh
+        '''
+        infile = os.path.abspath(infile)
+        return self.submit_io(f'read {os.path.basename(infile)}', UMesh, infile)
+
+
+    def write(self, Mesh, outfile, numprocs=1):
+        '''
+        Background write of a (future) UMesh, the returned future resolves to the (absolute) output path once written
+        (numprocs as in UMesh.write)
+        '''
+        outfile = os.path.abspath(outfile)
+        return self.submit_io(f'write {os.path.basename(outfile)}', write_mesh, Mesh, outfile, numprocs)
+
+
+    def submit_io(self, name, fn, *args, **kwargs):
+        future = self.io_pool.submit(self.timed, name, 'io', fn, *args, **kwargs)
+        self.io_futures.append(future)
+        return future
+
+
+    def timed(self, name, executor, fn, *args, **kwargs):
+        # resolve inputs first, so only the stage itself is timed
+        args = [resolve(arg) for arg in args]
+        kwargs = {key: resolve(val) for key, val in kwargs.items()}
+
+        start = time.time()
+        result = fn(*args, **kwargs)
+        end = time.time()
+
+        with self.events_lock:
+            self.events.append((name, executor, start-self.start_time, end-self.start_time))
+        return result
+
+
+    def wait(self):
+        '''
+        Waits for all background I/O, raising the first error if any
+        '''
+        for future in self.io_futures:
+            future.result()
+
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.io_pool.shutdown()
+
+
+    def timeline(self, width=50):
+        '''
+        Text report of when each stage ran, to see how much the stages overlapped
+        '''
+        with self.events_lock:
+            events = sorted(self.events, key=lambda event: event[2])
+        if not events: return 'No stages run'
+
+        total = max(event[3] for event in events)
+        busy = sum(event[3]-event[2] for event in events)
+        name_len = max(len(event[0]) for event in events)
+
+        lines = []
+        for name, executor, start, end in events:
+            bar_start, bar_end = int(width*start/total), max(int(width*end/total), int(width*start/total)+1)
+            bar = ' '*bar_start + '#'*(bar_end-bar_start) + ' '*(width-bar_end)
+            lines.append(f'{name:<{name_len}} {executor:<7} |{bar}| {start:8.2f}s - {end:8.2f}s ({end-start:.2f}s)')
+        lines.append(f'Wall time: {total:.2f}s, sum of stage times: {busy:.2f}s, overlapped: {max(busy-total, 0.0):.2f}s')
+
+        return '\n'.join(lines)
+
+
+
+def resolve(arg):
+    return arg.result() if isinstance(arg, Future) else arg
+
+
+def write_mesh(Mesh, outfile, numprocs=1):
+    Mesh.write(outfile, numprocs)
+    return outfile
@@ -1,8 +1,17 @@
 import os
 import io
 import time
+import json
+import zlib
+import struct
+import itertools
+import contextlib
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory, get_context
 from scipy.spatial import KDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 
 class UMesh:    
@@ -13,7 +22,6 @@ class UMesh:
     - Still kinda think the empty numpy business is funny
     - Add negative volume checking          
     - Get ugrid writer to work with .18e? not .18f? I think mesh_tools is what is breaking when trying to read in exponential formatted ugrid
-    - VTP writer    
     '''
 
     float_fmt = {'float_kind':lambda x: "%.18f" % x};
@@ -24,24 +32,51 @@ class UMesh:
     gmsh_tag_types  = {2:'tris', 3:'quads', 4:'tets', 5:'hexes', 6:'prisms', 7:'pyrmds'}
     gmsh_type_tags = {v: k for k, v in gmsh_tag_types.items()}
 
+    vtk_cell_types = {'tris':5, 'quads':9, 'tets':10, 'pyrmds':14, 'prisms':13, 'hexes':12}
+    vtk_data_types = {'float64':'Float64', 'float32':'Float32', 'int64':'Int64', 'int32':'Int32', 'int16':'Int16', 'int8':'Int8',
+                      'uint64':'UInt64', 'uint32':'UInt32', 'uint16':'UInt16', 'uint8':'UInt8'}
+    # node permutations to VTK ordering (as in meshio). VTK wedges have the (0,1,2) normal pointing away from (3,4,5), 
+    # gmsh/ugrid prisms towards. ugrid pyramids have the apex third, not last
+    vtk_node_orders = {'prisms':[0,2,1,3,5,4]}
+    ugrid_vtk_node_orders = {'pyrmds':[1,0,3,4,2], 'prisms':[0,2,1,3,5,4]}
+
+    # .umz compressed container settings (see write_umz)
+    umz_magic = b'UMZ1'
+    umz_chunk_bytes = 1 << 24   # uncompressed bytes per independently compressed chunk
+    umz_level = 1               # zlib level, favoring speed since this is a cache/archive format
+    umz_numthreads = os.cpu_count()
+
+    # ASCII writer settings (see write_block), with write(..., numprocs>1) sections above write_chunk_rows are formatted in parallel chunks
+    write_chunk_rows = 1 << 18
+
     def __init__(self, filename=''):
 
         self.filename = filename
         _, self.file_extension = os.path.splitext(self.filename)
 
-        print(f'Reading in meshfile: {self.filename}')
-
         # Initialize empty numpy arrays for supported element types
         self.nodes = np.empty((0, 3), dtype=np.double)
         for el_type, nodecount in self.el_type_node_counts.items():
             temp = {'defs': np.empty((0, nodecount),    dtype=np.uint32), 
                     'tags': np.empty((0, 1),            dtype=np.uint32)}
             setattr(self, el_type, temp)
+
+        # shared memory segments backing the arrays, if any (see to_shared, attach)
+        self.shm_segments = []
+        self.shm_owner = False
+
+        # no file, empty mesh to be filled in by caller (e.g. extract_surface, merge)
+        if not self.filename:
+            return
+
+        print(f'Reading in meshfile: {self.filename}')
         
         if self.file_extension == '.ugrid':
             self.read_ugrid()
         elif self.file_extension == '.msh':
             self.read_gmsh_v2()
+        elif self.file_extension == '.umz':
+            self.read_umz()
         else:
             raise Exception('Unrecognized mesh file extension!')
 
@@ -181,21 +216,29 @@ class UMesh:
 
         # Convert all back to numpy
         self.nodes = np.array(nodes, dtype=np.double)
-        for data in self.iter_elem_data:
-            data['defs'] = np.array(data['defs'], dtype=np.uint32)
-            data['tags'] = np.array(data['tags'], dtype=np.uint32)
+        for data, nodecount in zip(self.iter_elem_data, self.el_type_node_counts.values()):
+            data['defs'] = np.array(data['defs'], dtype=np.uint32).reshape(-1, nodecount)
+            data['tags'] = np.array(data['tags'], dtype=np.uint32).reshape(-1, 1)
 
 
-    def write(self, outfile):
+    def write(self, outfile, numprocs=1):
+        '''
+        Writes to the format given by the extension of outfile
 
+        numprocs: int, worker processes formatting the ASCII formats (.ugrid, .msh) in parallel chunks (see write_pool)
+        '''
         start_time = time.time()
         _, ext = os.path.splitext(outfile)
 
         match ext:
             case '.ugrid':
-                self.write_ugrid(outfile)
+                self.write_ugrid(outfile, numprocs)
             case '.msh':
-                self.write_gmsh_v2(outfile)
+                self.write_gmsh_v2(outfile, numprocs)
+            case '.umz':
+                self.write_umz(outfile)
+            case '.vtu':
+                self.write_vtu(outfile)
             case _:
                 raise Exception('Invalid extension specified!')
         
@@ -203,36 +246,36 @@ class UMesh:
 
 
 
-    def write_ugrid(self, outfile):
+    def write_ugrid(self, outfile, numprocs=1):
         '''
         https://www.simcenter.msstate.edu/software/documentation/ug_io/3d_grid_file_type_ugrid.html
         '''
         print(f'Writing ugrid to {outfile}...')
         
-        with open(outfile, 'w') as outfile:
+        with open(outfile, 'wb') as outfile, self.write_pool(numprocs) as pool:
 
             # write header
             header = f"{self.num_nodes} {self.num_tris} {self.num_quads} {self.num_tets} {self.num_pyrmds} {self.num_prisms} {self.num_hexes}"
-            outfile.write(header+'\n')
+            outfile.write((header+'\n').encode())
 
             # write nodes
-            np.savetxt(outfile, self.nodes, fmt='%.18f')
+            self.write_block(outfile, self.nodes, '%.18f', pool)
 
             # write boundary faces
             for geom_data in self.iter_boundary_data:
-                np.savetxt(outfile, geom_data['defs'], fmt='%i')
+                self.write_block(outfile, geom_data['defs'], '%i', pool)
 
             # write boundary tags
             for geom_data in self.iter_boundary_data:
-                np.savetxt(outfile, geom_data['tags'], fmt='%i')
+                self.write_block(outfile, geom_data['tags'], '%i', pool)
 
             # write volumes
             for geom_data in self.iter_volume_data:
-                np.savetxt(outfile, geom_data['defs'], fmt='%i')
+                self.write_block(outfile, geom_data['defs'], '%i', pool)
 
 
 
-    def write_gmsh_v2(self, outfile):
+    def write_gmsh_v2(self, outfile, numprocs=1):
         '''
         Making this able to write volumes, to see if I can just read everything into gmsh and not have to stitch together outside
         https://gmsh.info/doc/texinfo/gmsh.html#MSH-file-format-version-2-_0028Legacy_0029
@@ -265,23 +308,426 @@ class UMesh:
             ctr_el = ctr_el+geom_num_members 
 
 
-        with open(outfile, 'w') as outfile:
-            outfile.write('$MeshFormat\n')
-            outfile.write('2.2 0 8\n')
-            outfile.write('$EndMeshFormat\n')
+        with open(outfile, 'wb') as outfile, self.write_pool(numprocs) as pool:
+            outfile.write(b'$MeshFormat\n')
+            outfile.write(b'2.2 0 8\n')
+            outfile.write(b'$EndMeshFormat\n')
 
-            outfile.write('$Nodes\n')
-            outfile.write(f'{self.num_nodes}\n')
-            np.savetxt(outfile, node_block, fmt=['%i','%.18e','%.18e','%.18e'])
-            outfile.write('$EndNodes\n')
+            outfile.write(b'$Nodes\n')
+            outfile.write(f'{self.num_nodes}\n'.encode())
+            self.write_block(outfile, node_block, ['%i','%.18e','%.18e','%.18e'], pool)
+            outfile.write(b'$EndNodes\n')
             
-            outfile.write('$Elements\n')
-            outfile.write(f'{self.num_elements}\n')
+            outfile.write(b'$Elements\n')
+            outfile.write(f'{self.num_elements}\n'.encode())
             for block in element_blocks:
-                np.savetxt(outfile, block, fmt='%i')
-            outfile.write('$EndElements\n')
+                self.write_block(outfile, block, '%i', pool)
+            outfile.write(b'$EndElements\n')
+
+
+
+    def write_pool(self, numprocs):
+        '''
+        Process pool for the ASCII writers if numprocs > 1 and the mesh is big enough to be worth it 
+        (float/int to text is GIL-bound, so no threads). 
+
+        Workers are spawned, not forked, so this is safe from threads (e.g. MeshPipeline I/O), 
+        but the calling script needs an `if __name__ == '__main__':` guard
+        '''
+        if numprocs > 1 and max([self.num_nodes]+self.iter_elem_counts) > self.write_chunk_rows:
+            return ProcessPoolExecutor(numprocs, mp_context=get_context('spawn'))
+        return contextlib.nullcontext()
+
+
+
+    def write_block(self, outfile, data, fmt, pool=None):
+        '''
+        np.savetxt, but big arrays are split into row chunks that are formatted on the pool and written in order.
+        Output is byte-identical to np.savetxt. outfile must be opened in binary mode.
+        '''
+        if pool is None or data.shape[0] <= self.write_chunk_rows:
+            np.savetxt(outfile, data, fmt=fmt)
+            return
+
+        chunks = (data[i:i+self.write_chunk_rows] for i in range(0, data.shape[0], self.write_chunk_rows))
+        for chunk_bytes in pool.map(format_block, chunks, itertools.repeat(fmt)):
+            outfile.write(chunk_bytes)
         
 
+
+    def write_vtu(self, outfile, cell_data={}):
+        '''
+        VTK XML UnstructuredGrid, with raw binary appended data (for Paraview)
+        https://docs.vtk.org/en/latest/design_documents/VTKFileFormats.html#xml-file-formats
+
+        Element tags are written as the 'tags' cell array. Additional cell arrays (e.g. quality metrics) can be
+        passed in as cell_data {name: array}, ordered like the elements (tris, quads, tets, pyrmds, prisms, hexes).
+        bool arrays are written as UInt8.
+
+        Element nodes are taken to be in gmsh ordering, or ugrid ordering if the mesh was read from a .ugrid, 
+        and permuted to VTK ordering (see vtk_node_orders)
+        '''
+        print(f'Writing VTK XML UnstructuredGrid to {outfile}...')
+
+        # cell arrays, vectorized over each element type
+        node_orders = self.ugrid_vtk_node_orders if self.file_extension == '.ugrid' else self.vtk_node_orders
+        connectivity = np.concatenate([geom_data['defs'][:, node_orders.get(el_type, slice(None))].astype(np.int64).ravel()-1 
+                                       for el_type, geom_data in zip(self.iter_elem_type_strs, self.iter_elem_data)])
+        node_counts = np.repeat(list(self.el_type_node_counts.values()), self.iter_elem_counts)
+        offsets = np.cumsum(node_counts, dtype=np.int64)
+        types = np.repeat([self.vtk_cell_types[el_type] for el_type in self.iter_elem_type_strs], self.iter_elem_counts).astype(np.uint8)
+        tags = np.concatenate([geom_data['tags'].ravel() for geom_data in self.iter_elem_data]).astype(np.uint32)
+
+        # (section, name, array) in appended data order
+        arrays = [('Points', 'Points', np.ascontiguousarray(self.nodes, dtype=np.float64)),
+                  ('Cells', 'connectivity', connectivity), 
+                  ('Cells', 'offsets', offsets), 
+                  ('Cells', 'types', types),
+                  ('CellData', 'tags', tags)]
+
+        for name, data in cell_data.items():
+            data = np.asarray(data)
+            if len(data) != self.num_elements: raise Exception(f'Cell data {name} must have one value per element ({self.num_elements})')
+            if data.dtype == bool: data = data.astype(np.uint8)
+            if data.dtype.name not in self.vtk_data_types: 
+                raise Exception(f'Cell data {name} has unsupported dtype {data.dtype.name}, must be one of {list(self.vtk_data_types)} (or bool)')
+            arrays.append(('CellData', name, np.ascontiguousarray(data)))
+
+        # xml, with each array's offset into the appended data (each array is preceded by its UInt64 byte count)
+        sections = {'Points': [], 'Cells': [], 'CellData': []}
+        offset = 0
+        for section, name, data in arrays:
+            n_comp = data.shape[1] if data.ndim > 1 else 1
+            sections[section].append(f'<DataArray type="{self.vtk_data_types[data.dtype.name]}" Name="{name}" '
+                                     f'NumberOfComponents="{n_comp}" format="appended" offset="{offset}"/>')
+            offset += 8 + data.nbytes
+
+        header = ('<?xml version="1.0"?>\n'
+                  '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+                  '<UnstructuredGrid>\n'
+                  f'<Piece NumberOfPoints="{self.num_nodes}" NumberOfCells="{self.num_elements}">\n'
+                  + ''.join(f'<{section}>\n' + '\n'.join(entries) + f'\n</{section}>\n' for section, entries in sections.items()) +
+                  '</Piece>\n'
+                  '</UnstructuredGrid>\n'
+                  '<AppendedData encoding="raw">\n_')
+
+        with open(outfile, 'wb') as outfile:
+            outfile.write(header.encode())
+            for _, _, data in arrays:
+                outfile.write(struct.pack('<Q', data.nbytes))
+                outfile.write(data.astype(data.dtype.newbyteorder('<'), copy=False).tobytes())
+            outfile.write(b'\n</AppendedData>\n</VTKFile>\n')
+
+
+
+    def iter_blocks(self):
+        '''
+        (name, array) pairs for every array of the mesh, e.g. ('nodes', ...), ('tets/defs', ...), as stored in .umz/shared memory
+        '''
+        yield 'nodes', self.nodes
+        for el_type, geom_data in zip(self.iter_elem_type_strs, self.iter_elem_data):
+            yield f'{el_type}/defs', geom_data['defs']
+            yield f'{el_type}/tags', geom_data['tags']
+
+    def set_block(self, name, data):
+        if name == 'nodes':
+            self.nodes = data
+        else:
+            el_type, key = name.split('/')
+            getattr(self, el_type)[key] = data
+
+
+
+    def write_umz(self, outfile):
+        '''
+        Native compressed container for UMesh. Meant as a fast archive/cache format for intermediates, not for solvers.
+
+        Layout:
+            magic (4 bytes) | index length (uint64, little endian) | json index | chunk data
+
+        Every block (nodes, per-type defs/tags) is split into chunks of ~umz_chunk_bytes, which are zlib compressed
+        independently on a thread pool (zlib releases the GIL). The index stores dtype, shape and (offset, length) of
+        every chunk relative to the start of the chunk data, so any block can be read without touching the others.
+        '''
+        print(f'Writing compressed UMesh to {outfile}...')
+
+        # split blocks into raw byte chunks
+        index = {}
+        raw_chunks = []
+        for name, data in self.iter_blocks():
+            raw = np.ascontiguousarray(data).tobytes()
+            starts = range(0, max(len(raw), 1), self.umz_chunk_bytes)
+            index[name] = {'dtype': data.dtype.str, 'shape': list(data.shape), 
+                           'chunks': list(range(len(raw_chunks), len(raw_chunks)+len(starts)))}
+            raw_chunks.extend(raw[i:i+self.umz_chunk_bytes] for i in starts)
+
+        with ThreadPoolExecutor(self.umz_numthreads) as pool:
+            comp_chunks = list(pool.map(lambda c: zlib.compress(c, self.umz_level), raw_chunks))
+
+        # resolve chunk ids to (offset, length) in the data section
+        offsets = np.concatenate(([0], np.cumsum([len(c) for c in comp_chunks]))).tolist()
+        for block in index.values():
+            block['chunks'] = [[offsets[i], len(comp_chunks[i])] for i in block['chunks']]
+
+        index_bytes = json.dumps(index).encode()
+
+        with open(outfile, 'wb') as outfile:
+            outfile.write(self.umz_magic)
+            outfile.write(struct.pack('<Q', len(index_bytes)))
+            outfile.write(index_bytes)
+            for chunk in comp_chunks:
+                outfile.write(chunk)
+
+
+
+    @classmethod
+    def read_umz_index(cls, filename):
+        '''
+        Returns (index, data_start) of a .umz container, see write_umz
+        '''
+        with open(filename, 'rb') as ufile:
+            if ufile.read(4) != cls.umz_magic: raise Exception(f'{filename} is not a .umz file')
+            (index_len,) = struct.unpack('<Q', ufile.read(8))
+            index = json.loads(ufile.read(index_len))
+        return index, 4 + 8 + index_len
+
+
+
+    @classmethod
+    def read_umz_block(cls, filename, name, pool=None):
+        '''
+        Random access to a single block (e.g. 'nodes', 'tets/defs') of a .umz container, without reading the rest
+        '''
+        index, data_start = cls.read_umz_index(filename)
+        if name not in index: raise Exception(f'Block {name} not found in {filename}')
+        block = index[name]
+
+        comp_chunks = []
+        with open(filename, 'rb') as ufile:
+            for offset, length in block['chunks']:
+                ufile.seek(data_start + offset)
+                comp_chunks.append(ufile.read(length))
+
+        if pool is None:
+            raw_chunks = [zlib.decompress(c) for c in comp_chunks]
+        else:
+            raw_chunks = list(pool.map(zlib.decompress, comp_chunks))
+
+        return np.frombuffer(b''.join(raw_chunks), dtype=block['dtype']).reshape(block['shape'])
+
+
+
+    def read_umz(self):
+        '''
+        Reads every block of a .umz container, see write_umz
+        '''
+        print(f'Reading compressed UMesh: {self.filename} \n')
+
+        index, _ = self.read_umz_index(self.filename)
+
+        with ThreadPoolExecutor(self.umz_numthreads) as pool:
+            blocks = {name: self.read_umz_block(self.filename, name, pool) for name in index}
+
+        # frombuffer arrays are read-only, copy so the mesh can be modified in place like the other readers
+        for name, data in blocks.items():
+            self.set_block(name, data.copy())
+
+
+
+    def to_shared(self):
+        '''
+        Moves the mesh arrays into multiprocessing shared memory (one segment per block), and returns a small picklable 
+        handle that worker processes can pass to UMesh.attach to map the same arrays, without pickling/copying them.
+
+        This mesh owns the segments: call release_shared() (or use as a context manager) once workers are done,
+        which copies the arrays back into private memory and unlinks the segments.
+        '''
+        if self.shm_segments: raise Exception('UMesh is already in shared memory')
+
+        handle = {}
+        for name, data in list(self.iter_blocks()):
+            shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            shared_data = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+            shared_data[...] = data
+            self.set_block(name, shared_data)
+            self.shm_segments.append(shm)
+            handle[name] = (shm.name, data.shape, data.dtype.str)
+
+        self.shm_owner = True
+        return handle
+
+
+
+    @classmethod
+    def attach(cls, handle):
+        '''
+        Maps a UMesh from shared memory (see to_shared), without copying. Arrays are shared with the owner and every
+        other attached process, so modifying them in place modifies them everywhere. Call release_shared() when done.
+        '''
+        Mesh = cls()
+        for name, (shm_name, shape, dtype) in handle.items():
+            try:
+                # dont let this process's resource tracker unlink the owner's segments on exit (python >= 3.13)
+                shm = shared_memory.SharedMemory(name=shm_name, track=False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(name=shm_name)
+            Mesh.set_block(name, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+            Mesh.shm_segments.append(shm)
+        return Mesh
+
+
+
+    def release_shared(self):
+        '''
+        Detaches from shared memory. The owner keeps a private copy of the arrays and unlinks the segments, 
+        attached meshes are emptied. Any outside references to the shared arrays must be dropped before this.
+        '''
+        if not self.shm_segments: return
+
+        for name, data in list(self.iter_blocks()):
+            self.set_block(name, data.copy() if self.shm_owner else np.empty((0,) + data.shape[1:], dtype=data.dtype))
+        del data
+
+        for shm in self.shm_segments:
+            shm.close()
+            if self.shm_owner:
+                shm.unlink()
+
+        self.shm_segments = []
+        self.shm_owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release_shared()
+
+
+
+    def merge(self, other, tol=1e-12):
+        '''
+        Returns a new UMesh containing the elements of both self and other. Nodes of other that lie within tol
+        of a node of self are merged into it, so sub-domains meshed separately against a common interface surface
+        mesh come out conformal. Interface elements themselves are kept if present in either mesh.
+        '''
+        print(f'Merging UMeshes ({self.num_nodes} + {other.num_nodes} nodes)...')
+        OutMesh = UMesh()
+
+        # find nodes of other that coincide with nodes of self
+        shared = np.zeros(other.num_nodes, dtype=bool)
+        shared_idx = np.zeros(other.num_nodes, dtype=np.int64)
+        if self.num_nodes and other.num_nodes:
+            dist, idx = KDTree(self.nodes).query(other.nodes, distance_upper_bound=tol)
+            shared = np.isfinite(dist)
+            shared_idx[shared] = idx[shared]
+
+        # 1-indexed node numbers of other in the merged mesh
+        other_map = np.empty(other.num_nodes, dtype=np.uint32)
+        other_map[shared] = shared_idx[shared] + 1
+        other_map[~shared] = self.num_nodes + 1 + np.arange(np.count_nonzero(~shared))
+
+        OutMesh.nodes = np.concatenate((self.nodes, other.nodes[~shared]), axis=0)
+
+        for self_data, other_data, out_data in zip(self.iter_elem_data, other.iter_elem_data, OutMesh.iter_elem_data):
+            other_defs = other_map[other_data['defs'].astype(np.int64)-1]
+            out_data['defs'] = np.concatenate((self_data['defs'], other_defs), axis=0).astype(np.uint32)
+            out_data['tags'] = np.concatenate((self_data['tags'], other_data['tags']), axis=0).astype(np.uint32)
+
+        print(f'Merged {np.count_nonzero(shared)} coincident nodes')
+        return OutMesh
+
+
+
+    def check_surface(self):
+        '''
+        Fast (vectorized, edge-hashing) watertightness/manifoldness check of the boundary faces (tris, quads)
+
+        OUTPUTS:
+            report: dict of problem locations (empty arrays when clean), with 'ok' bool
+                boundary_edges:      (n,2,3) end points of edges used by only one face (holes, open edges)
+                nonmanifold_edges:   (n,2,3) end points of edges used by more than two faces
+                inconsistent_edges:  (n,2,3) end points of two-face edges traversed in the same direction by both faces (flipped orientation)
+                duplicate_faces:     (n,3)   centroids of faces with the same nodes as another face
+                nonmanifold_vertices:(n,3)   vertices whose faces don't form a single fan (surface pinched at a point)
+        '''
+        print(f'Checking surface of {self.num_bdr_elems} boundary faces...')
+
+        # directed edges of every face, in face order
+        face_edges = []
+        face_node_sets = []
+        for geom_data in self.iter_boundary_data:
+            defs = geom_data['defs'].astype(np.int64) - 1
+            face_edges.append(np.stack((defs, np.roll(defs, -1, axis=1)), axis=2).reshape(-1, 2))
+            face_node_sets.append(np.sort(defs, axis=1))
+        edges = np.concatenate(face_edges, axis=0)
+
+        # hash undirected edges, counting uses and net direction (+1 low->high, -1 high->low)
+        lo, hi = np.minimum(edges[:,0], edges[:,1]), np.maximum(edges[:,0], edges[:,1])
+        keys = lo*self.num_nodes + hi
+        unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        direction = np.bincount(inverse, weights=np.where(edges[:,0] < edges[:,1], 1, -1), minlength=unique_keys.size)
+
+        def edge_points(edge_keys):
+            return self.nodes[np.stack((edge_keys // self.num_nodes, edge_keys % self.num_nodes), axis=1)]
+
+        report = {'boundary_edges':     edge_points(unique_keys[counts == 1]),
+                  'nonmanifold_edges':  edge_points(unique_keys[counts > 2]),
+                  'inconsistent_edges': edge_points(unique_keys[(counts == 2) & (direction != 0)])}
+
+        # duplicate faces, by sorted node sets (per face type)
+        duplicates = []
+        for node_sets in face_node_sets:
+            if node_sets.shape[0] == 0: continue
+            _, face_inverse, face_counts = np.unique(node_sets, axis=0, return_inverse=True, return_counts=True)
+            duplicates.append(self.nodes[node_sets[face_counts[face_inverse.ravel()] > 1]].mean(axis=1))
+        report['duplicate_faces'] = np.concatenate(duplicates, axis=0) if duplicates else np.empty((0, 3))
+
+        # non-manifold vertices: the link of a vertex (edges of its faces opposite to it) is connected for a manifold surface,
+        # so count connected components of the link graph, with nodes (vertex, link node) and edges from the link edges
+        centers, link_starts, link_ends = [], [], []
+        for geom_data in self.iter_boundary_data:
+            defs = geom_data['defs'].astype(np.int64) - 1
+            nodecount = defs.shape[1]
+            for i_vert in range(nodecount):
+                for i_link in range(1, nodecount-1):
+                    centers.append(defs[:, i_vert])
+                    link_starts.append(defs[:, (i_vert+i_link) % nodecount])
+                    link_ends.append(defs[:, (i_vert+i_link+1) % nodecount])
+        centers, link_starts, link_ends = np.concatenate(centers), np.concatenate(link_starts), np.concatenate(link_ends)
+        link_keys, link_inverse = np.unique(np.concatenate((centers*self.num_nodes + link_starts, centers*self.num_nodes + link_ends)), return_inverse=True)
+        link_inverse = link_inverse.reshape(2, -1)
+        link_graph = coo_matrix((np.ones(centers.size), (link_inverse[0], link_inverse[1])), shape=(link_keys.size, link_keys.size))
+        _, link_labels = connected_components(link_graph, directed=False)
+        num_fans = np.bincount(np.unique(np.stack((link_keys // self.num_nodes, link_labels), axis=1), axis=0)[:,0], minlength=self.num_nodes)
+        report['nonmanifold_vertices'] = self.nodes[num_fans > 1]
+
+        report['ok'] = not any(report[key].shape[0] for key in ['boundary_edges', 'nonmanifold_edges', 'inconsistent_edges', 'duplicate_faces', 'nonmanifold_vertices'])
+
+        print(f"Boundary edges: {report['boundary_edges'].shape[0]}, non-manifold edges: {report['nonmanifold_edges'].shape[0]}, "
+              f"inconsistently oriented edges: {report['inconsistent_edges'].shape[0]}, duplicate faces: {report['duplicate_faces'].shape[0]}, "
+              f"non-manifold vertices: {report['nonmanifold_vertices'].shape[0]}\n")
+
+        return report
+
+
+
+    def remove_unused_nodes(self):
+        '''
+        Drops nodes not referenced by any element (in place), renumbering element definitions
+        '''
+        used = np.zeros(self.num_nodes, dtype=bool)
+        for geom_data in self.iter_elem_data:
+            used[geom_data['defs'].ravel().astype(np.int64)-1] = True
+
+        # 1-indexed new node numbers, valid for used nodes
+        new_idx = np.cumsum(used)
+
+        print(f'Removing {self.num_nodes - np.count_nonzero(used)} unused nodes')
+        self.nodes = self.nodes[used]
+        for geom_data in self.iter_elem_data:
+            geom_data['defs'] = new_idx[geom_data['defs'].astype(np.int64)-1].astype(np.uint32)
+
+
     
     def extract_surface(self, bc_target):
         
@@ -325,8 +771,8 @@ class UMesh:
 
 
 
-
-
-
-
-
+def format_block(data, fmt):
+    # np.savetxt formatting of an array to bytes (for UMesh.write_block pool workers)
+    buffer = io.BytesIO()
+    np.savetxt(buffer, data, fmt=fmt)
+    return buffer.getvalue()